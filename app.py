@@ -16,7 +16,7 @@ from judge import (
     generate_with_llm,
     EVALUATION_PROMPT
 )
-from logger import log_evaluation, get_evaluation_history
+from logger import LOG_COLUMNS, log_evaluation, get_evaluation_history, migrate_legacy_logs
 from intervention import InterventionPrompt
 from curriculum import CurriculumPrompt
 
@@ -24,6 +24,9 @@ from curriculum import CurriculumPrompt
 # Load environment variables
 load_dotenv()
 
+# Import evaluation logs from earlier versions of the app into the Parquet dataset
+migrate_legacy_logs()
+
 # Page configuration
 st.set_page_config(
     page_title="LLM Evaluation Playground",
@@ -277,7 +280,7 @@ with individual_tab:
                     consistency_score=scores["consistency"],
                     creativity_score=scores["creativity"]
                 )
-                st.success("✅ Results saved to evaluations.csv")
+                st.success("✅ Results saved to evaluations.parquet")
 
             except json.JSONDecodeError:
                 st.error("❌ Invalid JSON format in Input Data.")
@@ -410,7 +413,13 @@ if show_history:
     st.divider()
     st.header("📚 Evaluation History")
     
-    history_df = get_evaluation_history()
+    # The judge prompts are long and rebuilt from the question and answer, so only load them on request
+    include_prompts = st.checkbox("Include judge prompts", value=False)
+    history_columns = [
+        column for column in LOG_COLUMNS
+        if include_prompts or column != "judge_prompt_sha1"
+    ]
+    history_df = get_evaluation_history(columns=history_columns, resolve_texts=True)
     
     if not history_df.empty:
         # Display summary metrics
@@ -424,7 +433,7 @@ if show_history:
         
         with cols[1]:
             st.metric("Avg Rating (1-10)", f"{history_df['total_rating(1-10)'].dropna().mean():.2f}")
-            st.metric("Valid Responses", f"{history_df['validation_status'].apply(lambda x: 'Valid' in str(x)).sum()} / {len(history_df)}")
+            st.metric("Valid Responses", f"{history_df['validation_status'].astype(str).str.contains('Valid').sum()} / {len(history_df)}")
             
         with cols[2]:
             st.metric("Avg Relevance", f"{history_df['relevance_score'].dropna().mean():.2f}")
@@ -1,9 +1,60 @@
 """
 LLM-as-a-Judge evaluation logic using Gemini API
 """
+import asyncio
+import hashlib
+import json
 import re
+import sqlite3
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import closing
+from functools import lru_cache
 import google.generativeai as genai
-from typing import Tuple, Optional, Dict
+from google.api_core.exceptions import GoogleAPIError
+from typing import Tuple, Optional, Dict, Iterable, List
+
+
+# Keys of the scores dict returned by evaluate_with_gemini
+_SCORE_KEYS = ("total", "relevance", "clarity", "consistency", "creativity")
+# Scores outside 1-10 are treated as missing
+_VALID_SCORES = frozenset(range(1, 11))
+
+# Patterns are lowercase and run against text.lower(), which lets callers
+# prefilter with str.find and start the regex at the first keyword.
+# Separators between a keyword and its number use bounded quantifiers in atomic
+# groups (Python 3.11+), so long runs of ':', '*' or whitespace in the judge
+# output can't backtrack quadratically
+
+# Rating keywords like "Total Rating: 3", "Rating:** 3" or "Total Score: 8". No two
+# keywords match at the same position, so the alternation is ordered by how often
+# the judge format produces each keyword; _RATING_PRIORITY decides which one wins
+_RATING_RE = re.compile(
+    r'(?P<kind>total score|score|total rating|rating)(?>[:\s]{0,8})(?>\*{0,2})\s{0,4}(?P<val>\d{1,2})'
+)
+_RATING_PRIORITY = ("total score", "total rating", "rating", "score")
+_RELEVANCE_RE = re.compile(r'relevance score(?>[:\s-]{0,8})(?>\*{0,2})\s{0,4}(\d{1,2})')
+_CLARITY_RE = re.compile(r'clarity score(?>[:\s-]{0,8})(?>\*{0,2})\s{0,4}(\d{1,2})')
+_CONSISTENCY_RE = re.compile(r'consistency score(?>[:\s-]{0,8})(?>\*{0,2})\s{0,4}(\d{1,2})')
+_CREATIVITY_RE = re.compile(r'creativity(?:/innovation)? score(?>[:\s-]{0,8})(?>\*{0,2})\s{0,4}(\d{1,2})')
+
+# All per-criterion scores plus "Total Score" in one alternation, so the feedback is scanned
+# once. Alternatives follow the order in which EVALUATION_PROMPT asks for them
+_ALL_SCORES_RE = re.compile(
+    r'(?:(?P<kind>relevance|clarity|consistency|creativity)(?:/innovation)? score(?>[:\s-]{0,8})'
+    r'|(?P<total>total) score(?>[:\s]{0,8}))'
+    r'(?>\*{0,2})\s{0,4}(?P<val>\d{1,2})'
+)
+
+# Judge responses for (near-)deterministic calls are cached on disk
+JUDGE_CACHE_FILE = "judge_cache.sqlite3"
+JUDGE_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+JUDGE_CACHE_MAX_TEMPERATURE = 0.1
+# Part of the cache key; bump whenever score parsing changes so stale scores aren't served
+JUDGE_CACHE_VERSION = 1
+
+# API key the SDK was last configured with, see configure_gemini()
+_configured_api_key: Optional[str] = None
 
 
 EVALUATION_PROMPT = """You are an expert evaluator assessing the quality of AI-generated answers.
@@ -57,10 +108,44 @@ Provide your evaluation in the following format:
 **Total Score:** [The average of all scores, from 1 to 10]
 """
 
+# EVALUATION_PROMPT split once around its placeholders, so building a prompt is plain concatenation
+_PROMPT_PREFIX, _PROMPT_REST = EVALUATION_PROMPT.split("{question}", 1)
+_PROMPT_MIDDLE, _PROMPT_SUFFIX = _PROMPT_REST.split("{answer}", 1)
+# Part of the cache key, so editing the template invalidates cached responses
+_PROMPT_SHA256 = hashlib.sha256(EVALUATION_PROMPT.encode("utf-8")).hexdigest()
+
+
+def _build_prompt(question: str, answer: str) -> str:
+    """Fill EVALUATION_PROMPT with the question and answer."""
+    return f"{_PROMPT_PREFIX}{question}{_PROMPT_MIDDLE}{answer}{_PROMPT_SUFFIX}"
+
 
 def configure_gemini(api_key: str) -> None:
-    """Configure the Gemini API with the provided API key."""
+    """
+    Configure the Gemini API with the provided API key.
+    
+    The SDK shares one client, and so one connection, across all models until
+    it is configured again. Repeated calls with the same key are therefore
+    no-ops, so callers that run on every rerun keep the warm connection.
+    """
+    global _configured_api_key
+    if api_key == _configured_api_key:
+        return
+    
     genai.configure(api_key=api_key)
+    # Cached models hold on to the client of the previous key
+    _get_model.cache_clear()
+    _configured_api_key = api_key
+
+
+@lru_cache(maxsize=32)
+def _get_model(model_name: str, temperature: float) -> genai.GenerativeModel:
+    """Return a cached GenerativeModel for the given model name and temperature."""
+    generation_config = {"temperature": temperature}
+    return genai.GenerativeModel(
+        model_name,
+        generation_config=generation_config
+    )
 
 
 def evaluate_with_gemini(
@@ -81,41 +166,204 @@ def evaluate_with_gemini(
     Returns:
         Tuple of (feedback_text, scores_dict, prompt_text)
     """
+    # Create the prompt
+    prompt = _build_prompt(question, answer)
+    
+    # Only low-temperature calls are deterministic enough to reuse
+    cache_key = None
+    if temperature <= JUDGE_CACHE_MAX_TEMPERATURE:
+        cache_key = _cache_key(model_name, temperature, question, answer)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            feedback_text, scores = cached
+            return feedback_text, scores, prompt
+    
     try:
-        # Create the prompt
-        prompt = EVALUATION_PROMPT.format(question=question, answer=answer)
-        
-        # Initialize the model
-        generation_config = {"temperature": temperature}
-        model = genai.GenerativeModel(
-            model_name,
-            generation_config=generation_config
-        )
+        # Get the (cached) model
+        model = _get_model(model_name, temperature)
         
         # Generate evaluation
         response = model.generate_content(prompt)
         
-        # Extract the response text
+        # Extract the response text (raises ValueError if the response was blocked)
         feedback_text = response.text
         
-        # Parse the rating from the response
-        scores = {
-            "total": extract_rating(feedback_text),
-            "relevance": extract_relevance_score(feedback_text),
-            "clarity": extract_clarity_score(feedback_text),
-            "consistency": extract_consistency_score(feedback_text),
-            "creativity": extract_creativity_score(feedback_text),
-        }
-            
-        return feedback_text, scores, prompt
+    except (GoogleAPIError, ValueError) as e:
+        return _error_result(e, prompt)
+    
+    # Parse the rating from the response
+    scores = _parse_scores(feedback_text)
+    
+    if cache_key is not None:
+        _cache_put(cache_key, feedback_text, scores)
         
-    except Exception as e:
-        error_msg = f"Error during evaluation: {str(e)}"
-        prompt_for_error = EVALUATION_PROMPT.format(question=question, answer=answer)
-        return error_msg, {
-            "total": None, "relevance": None, "clarity": None,
-            "consistency": None, "creativity": None
-        }, prompt_for_error
+    return feedback_text, scores, prompt
+
+
+def _cache_key(model_name: str, temperature: float, question: str, answer: str) -> str:
+    """Build the response cache key for a judge call."""
+    payload = json.dumps(
+        {
+            "v": JUDGE_CACHE_VERSION, "p": _PROMPT_SHA256,
+            "m": model_name, "t": temperature, "q": question, "a": answer
+        },
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_connect() -> sqlite3.Connection:
+    """Open the response cache database, creating the table if needed."""
+    conn = sqlite3.connect(JUDGE_CACHE_FILE, timeout=5)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "key TEXT PRIMARY KEY, feedback TEXT NOT NULL, scores TEXT NOT NULL, created REAL NOT NULL)"
+    )
+    return conn
+
+
+def _cache_get(key: str) -> Optional[Tuple[str, Dict[str, Optional[int]]]]:
+    """
+    Look up a cached judge response.
+    
+    Returns:
+        Tuple of (feedback_text, scores_dict), or None on a miss or expired entry
+    """
+    try:
+        with closing(_cache_connect()) as conn:
+            row = conn.execute(
+                "SELECT feedback, scores FROM responses WHERE key = ? AND created >= ?",
+                (key, time.time() - JUDGE_CACHE_TTL_SECONDS)
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+    
+    if row is None:
+        return None
+    try:
+        scores = json.loads(row[1])
+    except ValueError:
+        # A corrupt entry is treated as a miss and overwritten by the next put
+        return None
+    if not isinstance(scores, dict):
+        return None
+    return row[0], scores
+
+
+def _cache_put(key: str, feedback_text: str, scores: Dict[str, Optional[int]]) -> None:
+    """Store a judge response in the cache, dropping expired entries. Failures are ignored."""
+    now = time.time()
+    try:
+        with closing(_cache_connect()) as conn, conn:
+            conn.execute(
+                "DELETE FROM responses WHERE created < ?",
+                (now - JUDGE_CACHE_TTL_SECONDS,)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, feedback, scores, created) VALUES (?, ?, ?, ?)",
+                (key, feedback_text, json.dumps(scores), now)
+            )
+    except sqlite3.Error:
+        pass
+
+
+def _error_result(error: Exception, prompt: str) -> Tuple[str, Dict[str, Optional[int]], str]:
+    """Build the (feedback_text, scores_dict, prompt_text) tuple returned for a failed evaluation."""
+    return f"Error during evaluation: {str(error)}", {kind: None for kind in _SCORE_KEYS}, prompt
+
+
+async def evaluate_with_gemini_async(
+    question: str,
+    answer: str,
+    model_name: str = "gemini-2.5-flash",
+    temperature: float = 0.5,
+    executor: Optional[Executor] = None
+) -> Tuple[str, Dict[str, Optional[int]], str]:
+    """
+    Evaluate an answer using Gemini API without blocking the event loop.
+    
+    The Gemini SDK is synchronous, so the call runs in a worker thread of
+    executor (the loop's default executor if None).
+    
+    Returns:
+        Tuple of (feedback_text, scores_dict, prompt_text)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, evaluate_with_gemini, question, answer, model_name, temperature
+    )
+
+
+def evaluate_batch(
+    items: Iterable[Tuple[str, str]],
+    model_name: str = "gemini-2.5-flash",
+    temperature: float = 0.5,
+    concurrency: int = 8
+) -> List[Tuple[str, Dict[str, Optional[int]], str]]:
+    """
+    Evaluate many (question, answer) pairs concurrently.
+    
+    A pair that fails with an unexpected exception gets the usual error tuple,
+    so it never discards the results of the other pairs.
+    
+    Args:
+        items: The (question, answer) pairs to evaluate
+        model_name: The Gemini model to use for evaluation
+        temperature: The temperature for the model generation
+        concurrency: Maximum number of judge requests in flight at once
+    
+    Returns:
+        List of (feedback_text, scores_dict, prompt_text), in the order of items
+    """
+    async def run_all(executor: Executor):
+        async def evaluate_one(question: str, answer: str):
+            try:
+                return await evaluate_with_gemini_async(
+                    question, answer, model_name, temperature, executor
+                )
+            except Exception as e:
+                return _error_result(e, _build_prompt(question, answer))
+        
+        return await asyncio.gather(*(evaluate_one(question, answer) for question, answer in items))
+    
+    # A dedicated pool, since the default executor may have fewer than `concurrency` workers
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return asyncio.run(run_all(executor))
+
+
+def _parse_scores(text: str) -> Dict[str, Optional[int]]:
+    """
+    Extract all scores from the evaluation text in a single regex pass.
+    
+    Like the individual extract_* functions, only the first occurrence of each
+    score is considered. The total falls back to extract_rating() when no valid
+    "Total Score" line is present.
+    
+    Args:
+        text: The evaluation response text
+    
+    Returns:
+        Dict of total, relevance, clarity, consistency and creativity scores
+    """
+    lowered = text.lower()
+    
+    # Every match contains " score" at most len("creativity/innovation")
+    # characters after its start, so the scan can begin there
+    first: Dict[str, int] = {}
+    start = lowered.find(" score")
+    if start >= 0:
+        for match in _ALL_SCORES_RE.finditer(lowered, max(0, start - 21)):
+            kind = match.group("kind") or match.group("total")
+            first.setdefault(kind, int(match.group("val")))
+    
+    scores: Dict[str, Optional[int]] = {}
+    for kind in _SCORE_KEYS:
+        score = first.get(kind)
+        scores[kind] = score if score in _VALID_SCORES else None
+    
+    if scores["total"] is None:
+        scores["total"] = _extract_rating_lowered(lowered)
+    return scores
 
 
 def extract_rating(text: str) -> Optional[int]:
@@ -128,21 +376,39 @@ def extract_rating(text: str) -> Optional[int]:
     Returns:
         The rating as an integer or None if not found
     """
-    # Look for patterns like "Total Rating: 3" or "Rating:** 3" or "Total Score: 8"
-    patterns = [
-        r'Total Score[:\s]*\*?\*?\s*(\d{1,2})',
-        r'Total Rating[:\s]*\*?\*?\s*(\d{1,2})',
-        r'Rating[:\s]*\*?\*?\s*(\d{1,2})',
-        r'Score[:\s]*\*?\*?\s*(\d{1,2})',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            rating = int(match.group(1))
-            if 1 <= rating <= 10:
+    return _extract_rating_lowered(text.lower())
+
+
+def _extract_rating_lowered(lowered: str) -> Optional[int]:
+    """extract_rating() for text that is already lowercased."""
+    # Fast path: the judge format ends with "Total Score: N". If that is the only
+    # "total score" in the text, it takes priority and only the tail needs matching
+    tail = lowered.rfind("total score")
+    if tail >= 0 and lowered.find("total score") == tail:
+        match = _RATING_RE.match(lowered, tail)
+        if match and match.group("kind") == "total score":
+            rating = int(match.group("val"))
+            if rating in _VALID_SCORES:
                 return rating
     
+    keywords = [i for i in (lowered.find("score"), lowered.find("rating")) if i >= 0]
+    if not keywords:
+        return None
+    
+    # One pass, starting at most len("total ") before the first keyword, collects
+    # the first occurrence of every keyword; the highest priority valid one wins
+    first: Dict[str, int] = {}
+    for match in _RATING_RE.finditer(lowered, max(0, min(keywords) - 6)):
+        kind = match.group("kind")
+        rating = int(match.group("val"))
+        first.setdefault(kind, rating)
+        # "Total Score: 8" is also the first bare "Score: 8" if none came before
+        first.setdefault(kind.rpartition(" ")[2], rating)
+    
+    for kind in _RATING_PRIORITY:
+        rating = first.get(kind)
+        if rating in _VALID_SCORES:
+            return rating
     return None
 
 
@@ -156,11 +422,14 @@ def extract_relevance_score(text: str) -> Optional[int]:
     Returns:
         The relevance score as an integer (1-10) or None if not found
     """
-    match = re.search(r'Relevance Score[:\s-]*\*?\*?\s*(\d{1,2})', text, re.IGNORECASE)
+    lowered = text.lower()
+    start = lowered.find("relevance score")
+    if start < 0:
+        return None
+    match = _RELEVANCE_RE.search(lowered, start)
     if match:
         score = int(match.group(1))
-        if 1 <= score <= 10:
-            return score
+        return score if score in _VALID_SCORES else None
     return None
 
 
@@ -174,11 +443,14 @@ def extract_clarity_score(text: str) -> Optional[int]:
     Returns:
         The clarity score as an integer (1-10) or None if not found
     """
-    match = re.search(r'Clarity Score[:\s-]*\*?\*?\s*(\d{1,2})', text, re.IGNORECASE)
+    lowered = text.lower()
+    start = lowered.find("clarity score")
+    if start < 0:
+        return None
+    match = _CLARITY_RE.search(lowered, start)
     if match:
         score = int(match.group(1))
-        if 1 <= score <= 10:
-            return score
+        return score if score in _VALID_SCORES else None
     return None
 
 
@@ -186,11 +458,14 @@ def extract_consistency_score(text: str) -> Optional[int]:
     """
     Extract the consistency score (1-10) from the evaluation text.
     """
-    match = re.search(r'Consistency Score[:\s-]*\*?\*?\s*(\d{1,2})', text, re.IGNORECASE)
+    lowered = text.lower()
+    start = lowered.find("consistency score")
+    if start < 0:
+        return None
+    match = _CONSISTENCY_RE.search(lowered, start)
     if match:
         score = int(match.group(1))
-        if 1 <= score <= 10:
-            return score
+        return score if score in _VALID_SCORES else None
     return None
 
 
@@ -198,11 +473,14 @@ def extract_creativity_score(text: str) -> Optional[int]:
     """
     Extract the creativity score (1-10) from the evaluation text.
     """
-    match = re.search(r'Creativity(?:/Innovation)? Score[:\s-]*\*?\*?\s*(\d{1,2})', text, re.IGNORECASE)
+    lowered = text.lower()
+    start = lowered.find("creativity")
+    if start < 0:
+        return None
+    match = _CREATIVITY_RE.search(lowered, start)
     if match:
         score = int(match.group(1))
-        if 1 <= score <= 10:
-            return score
+        return score if score in _VALID_SCORES else None
     return None
 
 
@@ -226,11 +504,7 @@ def generate_with_llm(
     """
     try:
         if provider == 'gemini':
-            generation_config = {"temperature": temperature}
-            model = genai.GenerativeModel(
-                model_name,
-                generation_config=generation_config
-            )
+            model = _get_model(model_name, temperature)
             response = model.generate_content(prompt)
             return response.text
         else:
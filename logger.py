@@ -1,19 +1,378 @@
 """
-CSV logging functionality
+Evaluation logging functionality
 """
+import atexit
+import csv
+import hashlib
+import json
+import queue
+import sys
+import threading
+import time
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Set, TextIO, Tuple
 import os
+from judge import EVALUATION_PROMPT, _build_prompt
 
 
-CSV_FILE = "evaluations.csv"
-CSV_HEADER = [
-    "timestamp", "model", "temperature", "question", "answer", "judge_feedback",
-    "judge_prompt", "total_rating(1-10)", "validation_status", "relevance_score",
-    "clarity_score", "consistency_score", "creativity_score"
-]
+# Parquet dataset directory; each batch of logged rows is written as one part file,
+# and runs of small parts are periodically compacted into larger ones
+PARQUET_FILE = "evaluations.parquet"
+# Large text fields are stored once in TEXTS_FILE and referenced from the log by SHA-1.
+# A judge prompt built from EVALUATION_PROMPT references the template instead, and is
+# rebuilt from the row's question and answer when read back
+TEXTS_FILE = "evaluations_texts.jsonl"
+TEXT_FIELDS = ("question", "answer", "judge_feedback", "judge_prompt")
+LOG_SCHEMA = pa.schema([
+    ("timestamp", pa.string()),
+    ("model", pa.string()),
+    ("temperature", pa.float64()),
+    ("question_sha1", pa.string()),
+    ("answer_sha1", pa.string()),
+    ("judge_feedback_sha1", pa.string()),
+    ("judge_prompt_sha1", pa.string()),
+    ("total_rating(1-10)", pa.int8()),
+    ("validation_status", pa.string()),
+    ("relevance_score", pa.int8()),
+    ("clarity_score", pa.int8()),
+    ("consistency_score", pa.int8()),
+    ("creativity_score", pa.int8()),
+])
+LOG_COLUMNS = LOG_SCHEMA.names
+
+# Compact pandas dtypes for get_evaluation_history
+_DTYPES = {
+    "total_rating(1-10)": "Int8",
+    "relevance_score": "Int8",
+    "clarity_score": "Int8",
+    "consistency_score": "Int8",
+    "creativity_score": "Int8",
+    "temperature": "float32",
+    "model": "category",
+    "validation_status": "category",
+}
+
+# CSV logs from before the Parquet dataset (the original layout, the hashed
+# layout, and files set aside as *.legacy-*.csv), imported by migrate_legacy_logs()
+LEGACY_CSV_FILES = ("evaluations.legacy-*.csv", "evaluations.csv")
+_MIGRATE_LEGACY = object()
+
+# Rows are written by a background thread so logging never blocks the caller;
+# readers wait at most LOG_FLUSH_TIMEOUT_SECONDS for queued rows to land
+LOG_FLUSH_TIMEOUT_SECONDS = 10.0
+_log_queue: queue.Queue = queue.Queue()
+
+# Part files are compacted in size tiers: once the newest LOG_COMPACT_PARTS parts are
+# all at level k, they are merged into one part of level k + 1. Every row is rewritten
+# about once per level and at most LOG_COMPACT_PARTS - 1 parts per level remain, so
+# the history is never rewritten wholesale
+LOG_COMPACT_PARTS = 16
+# Held while the dataset is written or compacted, so readers never see it half-merged
+_dataset_lock = threading.Lock()
+
+
+def _write_part(dataset_path: Path, table: pa.Table, level: int = 0, stamp: Optional[str] = None) -> Path:
+    """
+    Write a table as a new zstd-compressed part file of the Parquet dataset.
+    
+    Parts are named part-<stamp>-L<level>.parquet and read in name order, so
+    stamp defaults to the current time and a merged part reuses the stamp of
+    the oldest part it replaces.
+    """
+    if stamp is None:
+        stamp = f"{time.time_ns()}-{os.getpid()}"
+    name = f"part-{stamp}-L{level}.parquet"
+    
+    # Readers skip dot-files, so the part only becomes visible once complete
+    tmp_path = dataset_path / f".{name}"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, dataset_path / name)
+    return dataset_path / name
+
+
+def _rows_table(rows: List[dict]) -> Optional[pa.Table]:
+    """
+    Convert rows to a table with LOG_SCHEMA.
+    
+    A row that doesn't fit the schema, e.g. a score of 200 in an int8 column,
+    is reported and skipped instead of failing the whole batch.
+    
+    Returns:
+        The table, or None if no row could be converted
+    """
+    try:
+        return pa.Table.from_pylist(rows, schema=LOG_SCHEMA)
+    except pa.ArrowException:
+        pass
+    
+    tables = []
+    for row in rows:
+        try:
+            tables.append(pa.Table.from_pylist([row], schema=LOG_SCHEMA))
+        except pa.ArrowException as e:
+            print(f"Error logging evaluation from {row.get('timestamp')}: {e}", file=sys.stderr)
+    return pa.concat_tables(tables) if tables else None
+
+
+def _part_stamp_and_level(part: Path) -> Tuple[str, int]:
+    """Parse a part file name; parts written before compaction levels count as level 0."""
+    stamp = part.stem.split("-", 1)[1]
+    base, _, level = stamp.rpartition("-L")
+    if base and level.isdigit():
+        return base, int(level)
+    return stamp, 0
+
+
+def _compact_parts(dataset_path: Path) -> None:
+    """Merge the newest runs of same-level part files into larger ones, see LOG_COMPACT_PARTS."""
+    parts = sorted(dataset_path.glob("*.parquet"))
+    while parts:
+        # Only a run at the end is merged, so the rows keep their order
+        level = _part_stamp_and_level(parts[-1])[1]
+        run = []
+        for part in reversed(parts):
+            if _part_stamp_and_level(part)[1] != level:
+                break
+            run.insert(0, part)
+        if len(run) < LOG_COMPACT_PARTS:
+            break
+        
+        merged = pa.concat_tables([pq.read_table(part, schema=LOG_SCHEMA) for part in run])
+        stamp = _part_stamp_and_level(run[0])[0]
+        merged_path = _write_part(dataset_path, merged, level + 1, stamp)
+        for part in run:
+            part.unlink()
+        parts = parts[:len(parts) - len(run)] + [merged_path]
+
+
+def _write_parquet(rows: List[dict]) -> None:
+    """
+    Write rows as a new part file of the Parquet dataset.
+    
+    Interactive use logs one row per part, so small parts are then compacted
+    into larger ones, see LOG_COMPACT_PARTS.
+    """
+    table = _rows_table(rows)
+    if table is None:
+        return
+    
+    dataset_path = Path(PARQUET_FILE)
+    dataset_path.mkdir(exist_ok=True)
+    
+    with _dataset_lock:
+        _write_part(dataset_path, table)
+        _compact_parts(dataset_path)
+
+
+def _read_texts(
+    digests: Optional[Set[str]] = None,
+    templates: Optional[Set[str]] = None
+) -> Dict[str, str]:
+    """
+    Load stored texts from TEXTS_FILE, keyed by SHA-1.
+    
+    Args:
+        digests: Only load these texts (default: all of them)
+        templates: If given, the SHA-1 of every loaded prompt template is added to it
+    """
+    texts: Dict[str, str] = {}
+    texts_path = Path(TEXTS_FILE)
+    if texts_path.exists():
+        with texts_path.open(encoding="utf-8") as f:
+            for line in f:
+                # Entries start with their hash, so unwanted lines are skipped unparsed
+                if digests is not None and line.startswith('{"sha1": "') and line[10:50] not in digests:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                # Skip anything that isn't a complete {"sha1": ..., "text": ...} entry
+                if not isinstance(entry, dict):
+                    continue
+                digest, text = entry.get("sha1"), entry.get("text")
+                if isinstance(digest, str) and isinstance(text, str):
+                    if digests is not None and digest not in digests:
+                        continue
+                    texts[digest] = text
+                    if templates is not None and entry.get("template") is True:
+                        templates.add(digest)
+    return texts
+
+
+def _store_text(text: str, texts_file: TextIO, known_hashes: Set[str], template: bool = False) -> str:
+    """Append a text to TEXTS_FILE unless it is already stored, and return its SHA-1."""
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    if digest not in known_hashes:
+        entry = {"sha1": digest, "text": text}
+        if template:
+            entry["template"] = True
+        texts_file.write(json.dumps(entry) + "\n")
+        known_hashes.add(digest)
+    return digest
+
+
+def _store_texts(row: dict, texts_file: TextIO, known_hashes: Set[str]) -> dict:
+    """
+    Replace the text fields of a row with their SHA-1 hashes.
+    
+    Texts that are not yet in TEXTS_FILE are appended to it, so repeated
+    questions are only stored once. A judge prompt built from EVALUATION_PROMPT
+    only differs by its question and answer, so it references the template.
+    """
+    compact_row = {k: v for k, v in row.items() if k not in TEXT_FIELDS}
+    texts = {}
+    for field in TEXT_FIELDS:
+        if field not in row and f"{field}_sha1" in row:
+            # Already hashed, e.g. a row migrated from the hashed CSV layout
+            continue
+        texts[field] = "" if row[field] is None else str(row[field])
+    
+    for field, text in texts.items():
+        if field == "judge_prompt" and "question" in texts and "answer" in texts \
+                and text == _build_prompt(texts["question"], texts["answer"]):
+            compact_row["judge_prompt_sha1"] = _store_text(
+                EVALUATION_PROMPT, texts_file, known_hashes, template=True
+            )
+        else:
+            compact_row[f"{field}_sha1"] = _store_text(text, texts_file, known_hashes)
+    return compact_row
+
+
+def _fill_template(template: str, question, answer) -> str:
+    """Rebuild a judge prompt from its stored template, like judge._build_prompt."""
+    prefix, rest = template.split("{question}", 1)
+    middle, suffix = rest.split("{answer}", 1)
+    # Texts missing from TEXTS_FILE come back as NaN
+    question = question if isinstance(question, str) else ""
+    answer = answer if isinstance(answer, str) else ""
+    return f"{prefix}{question}{middle}{answer}{suffix}"
+
+
+def _legacy_row(row: Dict[str, str]) -> dict:
+    """Convert a row read from a pre-Parquet CSV log to a log_evaluation row."""
+    def number(value: Optional[str], cast):
+        try:
+            return cast(float(value)) if value else None
+        except ValueError:
+            return None
+    
+    converted = {
+        "timestamp": row.get("timestamp") or None,
+        "model": row.get("model") or None,
+        "temperature": number(row.get("temperature"), float),
+        "validation_status": row.get("validation_status") or None,
+    }
+    for column in LOG_SCHEMA.names:
+        if LOG_SCHEMA.field(column).type == pa.int8():
+            score = number(row.get(column), int)
+            converted[column] = score if score is not None and -128 <= score <= 127 else None
+    for field in TEXT_FIELDS:
+        if f"{field}_sha1" in row:
+            converted[f"{field}_sha1"] = row[f"{field}_sha1"] or None
+        else:
+            converted[field] = row.get(field)
+    return converted
+
+
+def _migrate_legacy_csv(texts_file: TextIO, known_hashes: Set[str]) -> None:
+    """
+    Import the CSV logs written before the Parquet dataset, once.
+    
+    Each imported file is renamed to <name>.migrated, so its rows are not
+    imported again and the original data stays on disk.
+    """
+    csv.field_size_limit(2**31 - 1)
+    for pattern in LEGACY_CSV_FILES:
+        for csv_path in sorted(Path().glob(pattern)):
+            with csv_path.open(newline="", encoding="utf-8") as f:
+                rows = [_legacy_row(row) for row in csv.DictReader(f)]
+            if rows:
+                compact_rows = [_store_texts(row, texts_file, known_hashes) for row in rows]
+                texts_file.flush()
+                _write_parquet(compact_rows)
+            csv_path.rename(csv_path.with_name(f"{csv_path.name}.migrated"))
+
+
+def _write_rows() -> None:
+    """Write queued rows to the Parquet dataset, one part file per batch."""
+    texts_file = None
+    known_hashes: Set[str] = set()
+    while True:
+        # Rows queued while the previous batch was written go out together
+        rows = [_log_queue.get()]
+        while True:
+            try:
+                rows.append(_log_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            if texts_file is None:
+                known_hashes = set(_read_texts())
+                texts_file = open(TEXTS_FILE, "a", encoding="utf-8")
+            rows_to_write = [row for row in rows if row is not _MIGRATE_LEGACY]
+            if len(rows_to_write) < len(rows):
+                try:
+                    _migrate_legacy_csv(texts_file, known_hashes)
+                except Exception as e:
+                    # A broken legacy file must not cost the rows logged in this session
+                    print(f"Error importing legacy evaluation logs: {e}", file=sys.stderr)
+            if rows_to_write:
+                compact_rows = [_store_texts(row, texts_file, known_hashes) for row in rows_to_write]
+                # Texts go to disk before the rows that reference them
+                texts_file.flush()
+                _write_parquet(compact_rows)
+        except Exception as e:
+            # Never let the writer die: the queue would never drain again
+            print(f"Error logging evaluation: {e}", file=sys.stderr)
+            if texts_file is not None:
+                texts_file.close()
+            texts_file = None
+        finally:
+            for _ in rows:
+                _log_queue.task_done()
+
+
+def _flush_log(timeout: float = LOG_FLUSH_TIMEOUT_SECONDS) -> bool:
+    """
+    Wait until all queued rows are written.
+    
+    Gives up after timeout seconds, or as soon as the writer thread is gone,
+    instead of blocking forever like Queue.join().
+    
+    Returns:
+        True if the queue drained, False otherwise
+    """
+    deadline = time.monotonic() + timeout
+    with _log_queue.all_tasks_done:
+        while _log_queue.unfinished_tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not _writer_thread.is_alive():
+                print("Warning: not all evaluations have been written to the log", file=sys.stderr)
+                return False
+            _log_queue.all_tasks_done.wait(min(remaining, 0.1))
+    return True
+
+
+_writer_thread = threading.Thread(target=_write_rows, name="evaluation-logger", daemon=True)
+_writer_thread.start()
+atexit.register(_flush_log)
+
+
+def migrate_legacy_logs() -> None:
+    """
+    Import the CSV logs written before the Parquet dataset (LEGACY_CSV_FILES).
+    
+    The import runs on the writer thread, after any rows already queued, and
+    readers wait for it like they wait for queued rows. Each imported file is
+    renamed to <name>.migrated, so calling this again only imports new files.
+    Call it before logging, so the imported rows come first in the history.
+    """
+    _log_queue.put(_MIGRATE_LEGACY)
 
 
 def log_evaluation(
@@ -31,7 +390,11 @@ def log_evaluation(
     creativity_score: Optional[int]
 ):
     """
-    Log an evaluation to a CSV file.
+    Log an evaluation to the Parquet evaluation log.
+    
+    The row is queued and written by a background thread, so this returns
+    without waiting for disk I/O. The question, answer, feedback and prompt
+    are stored in TEXTS_FILE and referenced from the log by SHA-1.
     
     Args:
         model: Name of the model being evaluated
@@ -66,32 +429,84 @@ def log_evaluation(
         "creativity_score": creativity_score
     }
     
-    # Check if file exists to write header
-    csv_path = Path(CSV_FILE)
-    
-    if csv_path.exists() and csv_path.stat().st_size > 0:
-        # Append to existing file
-        df = pd.read_csv(csv_path)
-        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    else:
-        # Create new file
-        df = pd.DataFrame([new_row], columns=CSV_HEADER)
-    
-    # Save to CSV
-    df.to_csv(csv_path, index=False)
+    # Hand the row to the writer thread; it is written to the log shortly after
+    _log_queue.put(new_row)
 
 
-def get_evaluation_history() -> pd.DataFrame:
+def get_evaluation_history(
+    columns: Optional[List[str]] = None,
+    resolve_texts: bool = False
+) -> pd.DataFrame:
     """
-    Load the evaluation history from CSV.
+    Load the evaluation history from the Parquet evaluation log.
+    
+    Args:
+        columns: Only load these columns (default: all of LOG_COLUMNS)
+        resolve_texts: Replace the *_sha1 columns with the texts they reference,
+            e.g. question_sha1 becomes question. Only the referenced texts are loaded
     
     Returns:
-        DataFrame with evaluation history, or empty DataFrame if file doesn't exist
+        DataFrame with evaluation history, or empty DataFrame if no evaluations were logged
     """
-    csv_path = Path(CSV_FILE)
+    # Make sure rows still in the queue are on disk first
+    _flush_log()
+    
+    dataset_path = Path(PARQUET_FILE)
     
-    if csv_path.exists() and csv_path.stat().st_size > 0:
-        return pd.read_csv(CSV_FILE)
+    # Prompts stored as a template are rebuilt from the question and answer
+    read_columns = columns
+    if resolve_texts and columns is not None and "judge_prompt_sha1" in columns:
+        read_columns = list(columns) + [c for c in ("question_sha1", "answer_sha1") if c not in columns]
+    
+    with _dataset_lock:
+        if dataset_path.is_dir() and any(dataset_path.glob("*.parquet")):
+            table = pq.read_table(PARQUET_FILE, columns=read_columns, schema=LOG_SCHEMA)
+        else:
+            table = None
+    
+    if table is not None:
+        # Keep int8 scores as nullable Int8 instead of widening them to float64
+        df = table.to_pandas(types_mapper={pa.int8(): pd.Int8Dtype()}.get)
     else:
-        return pd.DataFrame(columns=CSV_HEADER)
+        df = pd.DataFrame(columns=read_columns or LOG_COLUMNS)
+    
+    df = df.astype({col: dtype for col, dtype in _DTYPES.items() if col in df.columns})
+    
+    if resolve_texts:
+        hashed = {f"{field}_sha1": field for field in TEXT_FIELDS if f"{field}_sha1" in df.columns}
+        if hashed:
+            digests = set(pd.unique(df[list(hashed)].to_numpy().ravel()))
+            templates: Set[str] = set()
+            texts = _read_texts(digests, templates)
+            prompt_hashes = df["judge_prompt_sha1"] if "judge_prompt_sha1" in hashed else None
+            for column in hashed:
+                df[column] = df[column].map(texts)
+            df = df.rename(columns=hashed)
+            
+            if prompt_hashes is not None and templates:
+                from_template = prompt_hashes.isin(templates)
+                df.loc[from_template, "judge_prompt"] = [
+                    _fill_template(template, question, answer)
+                    for template, question, answer in zip(
+                        df.loc[from_template, "judge_prompt"],
+                        df.loc[from_template, "question"],
+                        df.loc[from_template, "answer"],
+                    )
+                ]
+            df = df[[hashed.get(column, column) for column in (columns or LOG_COLUMNS)]]
+    
+    return df
+
 
+def get_evaluation_texts() -> Dict[str, str]:
+    """
+    Load the logged question, answer, feedback and prompt texts.
+    
+    Prompts built from the judge template map to the template itself; use
+    get_evaluation_history(resolve_texts=True) to get the full prompts.
+    
+    Returns:
+        Dict mapping the SHA-1 values in the history to the original texts
+    """
+    _flush_log()
+    return _read_texts()
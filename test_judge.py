@@ -0,0 +1,151 @@
+"""
+Tests for judge.py
+"""
+import unittest
+from unittest import mock
+
+import judge
+from judge import (
+    _get_model,
+    _parse_scores,
+    configure_gemini,
+    extract_clarity_score,
+    extract_consistency_score,
+    extract_creativity_score,
+    extract_rating,
+    extract_relevance_score,
+)
+
+
+JUDGE_FEEDBACK = """**Relevance:** Addresses the question directly.
+**Relevance Score:** 9
+
+**Clarity:** Well structured.
+**Clarity Score:** 8
+
+**Consistency:** No contradictions.
+**Consistency Score:** 7
+
+**Creativity/Innovation:** Fairly standard answer.
+**Creativity Score:** 5
+
+**Total Score:** 7
+"""
+
+
+class ExtractRatingTest(unittest.TestCase):
+    def test_judge_format(self):
+        self.assertEqual(extract_rating(JUDGE_FEEDBACK), 7)
+
+    def test_total_score_beats_bare_score(self):
+        self.assertEqual(extract_rating("Score: 3\nTotal Score: 8"), 8)
+
+    def test_total_score_counts_as_first_bare_score(self):
+        self.assertEqual(extract_rating("Total Score: 8\nScore: 3"), 8)
+        self.assertIsNone(extract_rating("Total Score: 11\nScore: 3"))
+
+    def test_priority_order(self):
+        self.assertEqual(extract_rating("Score: 2\nRating: 4\nTotal Rating: 6"), 6)
+        self.assertEqual(extract_rating("Score: 2\nRating: 4"), 4)
+        self.assertEqual(extract_rating("Total Rating: 6\nTotal Score: 9"), 9)
+
+    def test_first_occurrence_of_a_keyword_wins(self):
+        self.assertEqual(extract_rating("Total Score: 4\nTotal Score: 9"), 4)
+        self.assertEqual(extract_rating("Rating: 5 and later Rating: 2"), 5)
+
+    def test_invalid_value_falls_through_to_next_keyword(self):
+        self.assertEqual(extract_rating("Total Score: 0\nRating: 6"), 6)
+        self.assertEqual(extract_rating("Total Rating: 11\nScore: 3"), 3)
+
+    def test_invalid_first_occurrence_is_not_replaced_by_a_later_one(self):
+        self.assertIsNone(extract_rating("Total Score: 0\nTotal Score: 7"))
+
+    def test_separators(self):
+        self.assertEqual(extract_rating("**Total Score:** 8"), 8)
+        self.assertEqual(extract_rating("TOTAL SCORE :\n  6"), 6)
+        self.assertEqual(extract_rating("Rating:** 3"), 3)
+
+    def test_no_rating(self):
+        self.assertIsNone(extract_rating(""))
+        self.assertIsNone(extract_rating("No numbers here"))
+        self.assertIsNone(extract_rating("Score: high"))
+
+
+class ExtractCriterionScoresTest(unittest.TestCase):
+    def test_judge_format(self):
+        self.assertEqual(extract_relevance_score(JUDGE_FEEDBACK), 9)
+        self.assertEqual(extract_clarity_score(JUDGE_FEEDBACK), 8)
+        self.assertEqual(extract_consistency_score(JUDGE_FEEDBACK), 7)
+        self.assertEqual(extract_creativity_score(JUDGE_FEEDBACK), 5)
+
+    def test_creativity_innovation(self):
+        self.assertEqual(extract_creativity_score("Creativity/Innovation Score: 6"), 6)
+        self.assertEqual(extract_creativity_score("**Creativity/Innovation:** ok\nCreativity Score: 4"), 4)
+
+    def test_out_of_range_score(self):
+        self.assertIsNone(extract_clarity_score("Clarity Score: 0"))
+        self.assertIsNone(extract_relevance_score("Relevance Score: 11"))
+
+    def test_missing_score(self):
+        self.assertIsNone(extract_consistency_score("Consistency: fine"))
+
+
+class ParseScoresTest(unittest.TestCase):
+    def test_judge_format(self):
+        self.assertEqual(
+            _parse_scores(JUDGE_FEEDBACK),
+            {"total": 7, "relevance": 9, "clarity": 8, "consistency": 7, "creativity": 5},
+        )
+
+    def test_matches_individual_extractors(self):
+        texts = [
+            JUDGE_FEEDBACK,
+            "Rating: 6\nRelevance Score: 12\nCreativity/Innovation Score: 3",
+            "Total Score: 0\nScore: 4\nClarity Score - 2",
+            "",
+        ]
+        for text in texts:
+            with self.subTest(text=text):
+                self.assertEqual(
+                    _parse_scores(text),
+                    {
+                        "total": extract_rating(text),
+                        "relevance": extract_relevance_score(text),
+                        "clarity": extract_clarity_score(text),
+                        "consistency": extract_consistency_score(text),
+                        "creativity": extract_creativity_score(text),
+                    },
+                )
+
+    def test_falls_back_to_rating_without_total_score(self):
+        self.assertEqual(_parse_scores("Relevance Score: 8\nRating: 6")["total"], 6)
+
+
+class ModelCacheTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            judge.genai, configure=mock.DEFAULT, GenerativeModel=mock.DEFAULT
+        )
+        self.genai = patcher.start()
+        self.genai["GenerativeModel"].side_effect = lambda *args, **kwargs: object()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(_get_model.cache_clear)
+        self.addCleanup(setattr, judge, "_configured_api_key", judge._configured_api_key)
+        _get_model.cache_clear()
+
+    def test_models_are_reused_for_the_same_key(self):
+        configure_gemini("key-a")
+        model = _get_model("gemini-2.5-flash", 0.5)
+        configure_gemini("key-a")
+        self.assertIs(_get_model("gemini-2.5-flash", 0.5), model)
+        self.genai["configure"].assert_called_once_with(api_key="key-a")
+
+    def test_new_key_drops_cached_models(self):
+        configure_gemini("key-a")
+        model = _get_model("gemini-2.5-flash", 0.5)
+        configure_gemini("key-b")
+        self.assertIsNot(_get_model("gemini-2.5-flash", 0.5), model)
+
+
+if __name__ == "__main__":
+    unittest.main()